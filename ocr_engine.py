@@ -1,8 +1,16 @@
 import os
 import cv2
+import hashlib
+import inspect
+import json
 import numpy as np
 import pytesseract
 import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 def configure_tesseract():
     exe = shutil.which("tesseract")
@@ -26,48 +34,253 @@ def configure_tesseract():
 
 configure_tesseract()
 
-def _preprocess_for_ocr(img_bgr: np.ndarray) -> np.ndarray:
+# =========================
+# Preprocessing pipeline
+# =========================
+# A pipeline is a list of {"stage": name, **params} dicts, applied in order.
+# It is plain JSON, so it can be saved as a profile and loaded per call.
+DEFAULT_PIPELINE = [
+    {"stage": "upscale", "target_long_side": 1800},
+    {"stage": "grayscale"},
+    {"stage": "clahe", "clip_limit": 2.0, "tile_grid_size": 8},
+    {"stage": "median", "ksize": 3},
+    {"stage": "unsharp", "sigma": 1.0, "amount": 1.6},
+    {"stage": "otsu"},
+]
 
-    # 1) Normalize resolution (standardize by the longest side)
-    h, w = img_bgr.shape[:2]
-    long_side = max(h, w)
 
-    TARGET_LONG_SIDE = 1800
-    if long_side < TARGET_LONG_SIDE:
-        scale = TARGET_LONG_SIDE / long_side
-        img_bgr = cv2.resize(
-            img_bgr,
+def _stage_upscale(img: np.ndarray, target_long_side: int = 1800) -> np.ndarray:
+    # Normalize resolution (standardize by the longest side)
+    h, w = img.shape[:2]
+    long_side = max(h, w)
+    if long_side < target_long_side:
+        scale = target_long_side / long_side
+        img = cv2.resize(
+            img,
             None,
             fx=scale,
             fy=scale,
             interpolation=cv2.INTER_CUBIC,
         )
+    return img
+
+
+def _stage_grayscale(img: np.ndarray) -> np.ndarray:
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def _stage_clahe(img: np.ndarray, clip_limit: float = 2.0, tile_grid_size=8) -> np.ndarray:
+    # Improve local contrast; tile_grid_size is N (N x N tiles) or [cols, rows]
+    if isinstance(tile_grid_size, (list, tuple)):
+        tiles = tuple(tile_grid_size)
+    else:
+        tiles = (tile_grid_size, tile_grid_size)
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tiles)
+    return clahe.apply(img)
+
+
+def _stage_median(img: np.ndarray, ksize: int = 3) -> np.ndarray:
+    # Light denoising
+    return cv2.medianBlur(img, ksize)
+
+
+def _stage_unsharp(img: np.ndarray, sigma: float = 1.0, amount: float = 1.6) -> np.ndarray:
+    # Sharpen text edges: img * amount + blurred * (1 - amount)
+    blurred = cv2.GaussianBlur(img, (0, 0), sigma)
+    return cv2.addWeighted(img, amount, blurred, 1.0 - amount, 0)
+
+
+def _stage_otsu(img: np.ndarray) -> np.ndarray:
+    # Binarize using Otsu's thresholding
+    return cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+STAGES = {
+    "upscale": _stage_upscale,
+    "grayscale": _stage_grayscale,
+    "clahe": _stage_clahe,
+    "median": _stage_median,
+    "unsharp": _stage_unsharp,
+    "otsu": _stage_otsu,
+}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_positive_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def _is_tile_grid(value) -> bool:
+    if isinstance(value, (list, tuple)):
+        return len(value) == 2 and all(_is_positive_int(v) for v in value)
+    return _is_positive_int(value)
+
+
+# Per-stage parameter checks: name -> (check, description for the error)
+_PARAM_CHECKS = {
+    "upscale": {
+        "target_long_side": (_is_positive_int, "a positive integer"),
+    },
+    "clahe": {
+        "clip_limit": (lambda v: _is_number(v) and v > 0, "a positive number"),
+        "tile_grid_size": (_is_tile_grid, "a positive integer or a pair of positive integers"),
+    },
+    "median": {
+        "ksize": (lambda v: _is_positive_int(v) and v % 2 == 1, "an odd integer >= 1"),
+    },
+    "unsharp": {
+        "sigma": (lambda v: _is_number(v) and v > 0, "a positive number"),
+        "amount": (_is_number, "a number"),
+    },
+}
+
+
+def validate_pipeline(pipeline) -> None:
+    if not isinstance(pipeline, list):
+        raise ValueError("A pipeline must be a list of stages.")
+
+    for step in pipeline:
+        if not isinstance(step, dict):
+            raise ValueError(f"Invalid pipeline step (expected an object): {step!r}")
+
+        name = step.get("stage")
+        if not isinstance(name, str) or name not in STAGES:
+            raise ValueError(f"Unknown preprocessing stage: {name!r}")
+
+        allowed = list(inspect.signature(STAGES[name]).parameters)[1:]
+        checks = _PARAM_CHECKS.get(name, {})
+        for key, value in step.items():
+            if key == "stage":
+                continue
+            if key not in allowed:
+                raise ValueError(
+                    f"Unknown parameter {key!r} for stage {name!r} "
+                    f"(expected one of: {', '.join(allowed) or 'none'})."
+                )
+            check, expected = checks[key]
+            if not check(value):
+                raise ValueError(
+                    f"Invalid value for {key!r} in stage {name!r}: {value!r} (expected {expected})."
+                )
+
+
+def load_pipeline(path: str) -> list:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+
+    with open(path, "r", encoding="utf-8") as f:
+        pipeline = json.load(f)
+
+    validate_pipeline(pipeline)
+    return pipeline
+
+
+def save_pipeline(pipeline: list, path: str) -> None:
+    validate_pipeline(pipeline)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(pipeline, f, indent=2)
+
+
+# Intermediate results memoized by (input hash, stage prefix), so changing only
+# the last stage's parameters re-runs just that stage. Opt-in (cache=True) for
+# interactive tuning/preview; bounded by total array size, not entry count.
+_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def clear_preprocess_cache() -> None:
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _image_hash(img: np.ndarray) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((img.shape, img.dtype.str)).encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+        return value
+
+
+def _cache_put(key, value: np.ndarray) -> None:
+    global _cache_bytes
+    if value.nbytes > _CACHE_MAX_BYTES:
+        return
+
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old.nbytes
+        _cache[key] = value
+        _cache_bytes += value.nbytes
+        while _cache_bytes > _CACHE_MAX_BYTES:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= evicted.nbytes
 
-    # 2) Convert to grayscale
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
 
-    # 3) Improve local contrast with CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
+def _preprocess_for_ocr(img_bgr: np.ndarray, pipeline: list = None, cache: bool = False) -> np.ndarray:
+    if pipeline is None:
+        pipeline = DEFAULT_PIPELINE
+    validate_pipeline(pipeline)
 
-    # 4) Light denoising (median filter)
-    gray = cv2.medianBlur(gray, 3)
+    img = img_bgr
+    done = 0
+    if cache:
+        steps = [json.dumps(step, sort_keys=True) for step in pipeline]
+        img_key = _image_hash(img_bgr)
 
-    # 5) Sharpen text edges (unsharp mask)
-    blurred = cv2.GaussianBlur(gray, (0, 0), 1.0)
-    sharp = cv2.addWeighted(gray, 1.6, blurred, -0.6, 0)
+        # Resume from the longest cached prefix
+        for i in range(len(steps), 0, -1):
+            cached = _cache_get((img_key, tuple(steps[:i])))
+            if cached is not None:
+                img, done = cached, i
+                break
 
-    # 6) Binarize using Otsu's thresholding
-    thr = cv2.threshold(sharp, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    for i in range(done, len(pipeline)):
+        params = dict(pipeline[i])
+        name = params.pop("stage")
+        prev = img
+        img = STAGES[name](img, **params)
+        if cache:
+            if img is prev and prev is not img_bgr:
+                # Pass-through stage: the array is already cached, don't count it twice
+                continue
+            if img is img_bgr:
+                # Don't keep a reference to the caller's array in the cache
+                img = img.copy()
+            # Cached arrays are shared between calls, so keep them read-only
+            img.setflags(write=False)
+            _cache_put((img_key, tuple(steps[: i + 1])), img)
 
-    return thr
+    return img
 
 
-def ocr_bgr(img_bgr: np.ndarray, lang: str = "por") -> str:
+def ocr_bgr(img_bgr: np.ndarray, lang: str = "por", pipeline: list = None, cache: bool = False) -> str:
     if img_bgr is None:
         raise ValueError("Empty image (None).")
 
-    pre = _preprocess_for_ocr(img_bgr)
+    # Wait for any running batch, so this call doesn't inherit its thread limits
+    with _thread_limits.shared():
+        return _ocr_bgr(img_bgr, lang=lang, pipeline=pipeline, cache=cache)
+
+
+def _ocr_bgr(img_bgr: np.ndarray, lang: str = "por", pipeline: list = None, cache: bool = False) -> str:
+    pre = _preprocess_for_ocr(img_bgr, pipeline=pipeline, cache=cache)
 
     # Tesseract settings:
     # --oem 3: use the default OCR engine mode
@@ -76,7 +289,7 @@ def ocr_bgr(img_bgr: np.ndarray, lang: str = "por") -> str:
     return pytesseract.image_to_string(pre, lang=lang, config=config)
 
 
-def ocr_image(image_path: str, lang: str = "por") -> str:
+def ocr_image(image_path: str, lang: str = "por", pipeline: list = None, cache: bool = False) -> str:
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"File not found: {image_path}")
 
@@ -84,4 +297,278 @@ def ocr_image(image_path: str, lang: str = "por") -> str:
     if img is None:
         raise ValueError("Could not open the image. Check the file path/format.")
 
-    return ocr_bgr(img, lang=lang)
\ No newline at end of file
+    return ocr_bgr(img, lang=lang, pipeline=pipeline, cache=cache)
+
+# =========================
+# Thread / worker scheduling
+# =========================
+# Tesseract uses OpenMP internally and OpenCV has its own thread pool, so
+# running several OCR calls in parallel oversubscribes the cores. Each call
+# gets `threads` intra-image threads and `workers` images run at once, with
+# workers * threads <= CPU count. Each Tesseract call is its own process, so
+# the workers are plain threads driving those processes.
+#
+# Both limits are process-global (pytesseract has no per-call env), so a batch
+# holds _thread_limits exclusively and restores the previous values when it
+# ends. Single ocr_bgr calls hold it shared: they run concurrently with each
+# other but wait for a running batch instead of picking up its limits.
+# Tesseract calls made outside this module still see the batch's
+# OMP_THREAD_LIMIT while a batch runs.
+_CPU_COUNT = os.cpu_count() or 1
+
+# Each measured chunk is a whole number of waves of `workers` images, and a
+# candidate split is timed over at least this many waves. Splits are scored by
+# pixels/sec after upscaling, so image content/size differences even out.
+_TUNE_WAVES = 3
+
+
+class _SharedLock:
+    # Many holders in shared mode, or one in exclusive mode. A waiting
+    # exclusive holder blocks new shared ones, so batches aren't starved.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._exclusive or self._waiting:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._exclusive or self._shared:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+_thread_limits = _SharedLock()
+_sched_lock = threading.Lock()
+_last_split = None  # (workers, threads) of the most recent batch
+_tuning = {}  # size bucket -> {"timings": {split: [images, pixels, seconds]}, "best": split}
+_metrics = {"images": 0, "pixels": 0, "seconds": 0.0}
+
+
+@contextmanager
+def _thread_split(workers: int, threads: int):
+    if workers < 1 or threads < 1:
+        raise ValueError("workers and threads must be >= 1.")
+
+    prev_omp = os.environ.get("OMP_THREAD_LIMIT")
+    prev_cv = cv2.getNumThreads()
+    # Inherited by the tesseract subprocesses spawned by pytesseract
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
+    cv2.setNumThreads(threads)
+    try:
+        yield
+    finally:
+        if prev_omp is None:
+            os.environ.pop("OMP_THREAD_LIMIT", None)
+        else:
+            os.environ["OMP_THREAD_LIMIT"] = prev_omp
+        cv2.setNumThreads(prev_cv)
+
+
+def _candidate_splits() -> list:
+    splits = []
+    workers = 1
+    while workers < _CPU_COUNT:
+        splits.append((workers, max(1, _CPU_COUNT // workers)))
+        workers *= 2
+    splits.append((_CPU_COUNT, 1))
+    return splits
+
+
+def _work_pixels(img: np.ndarray, pipeline: list) -> int:
+    # Pixel count after the upscale stage(s), i.e. what Tesseract actually reads
+    h, w = img.shape[:2]
+    default_target = inspect.signature(_stage_upscale).parameters["target_long_side"].default
+    for step in pipeline:
+        if step["stage"] == "upscale":
+            target = step.get("target_long_side", default_target)
+            if max(h, w) < target:
+                scale = target / max(h, w)
+                h, w = round(h * scale), round(w * scale)
+    return h * w
+
+
+def _size_bucket(images: list, pipeline: list) -> int:
+    # Median image size, rounded to a power of two in megapixels
+    pixels = sorted(_work_pixels(img, pipeline) for img in images)
+    megapixels = pixels[len(pixels) // 2] / 1e6
+    return int(round(np.log2(max(megapixels, 1e-3))))
+
+
+def _run_split(images: list, workers: int, threads: int, lang: str, pipeline: list):
+    global _last_split
+
+    with _thread_split(workers, threads):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda img: _ocr_bgr(img, lang=lang, pipeline=pipeline), images))
+        elapsed = time.perf_counter() - start
+
+    pixels = sum(_work_pixels(img, pipeline) for img in images)
+    with _sched_lock:
+        _last_split = (workers, threads)
+        _metrics["images"] += len(images)
+        _metrics["pixels"] += pixels
+        _metrics["seconds"] += elapsed
+
+    return results, pixels, elapsed
+
+
+def _pixel_rate(timing: list) -> float:
+    return timing[1] / max(timing[2], 1e-9)
+
+
+def _next_tuning_step(state: dict):
+    # Returns (split, image count still needed), or (best split, None) once tuned
+    if state["best"] is not None:
+        return state["best"], None
+
+    for split in _candidate_splits():
+        done = state["timings"].get(split, [0, 0, 0.0])[0]
+        needed = _TUNE_WAVES * split[0] - done
+        if needed > 0:
+            return split, needed
+
+    # All candidates measured: keep the one with the best pixels/sec
+    state["best"] = max(state["timings"], key=lambda s: _pixel_rate(state["timings"][s]))
+    return state["best"], None
+
+
+def _fallback_split(state: dict):
+    # Best split measured so far, for chunks too small to measure anything
+    if state and state["timings"]:
+        return max(state["timings"], key=lambda s: _pixel_rate(state["timings"][s]))
+    return (_CPU_COUNT, 1)
+
+
+def ocr_batch(
+    images: list,
+    lang: str = "por",
+    pipeline: list = None,
+    workers: int = None,
+    threads: int = None,
+    auto_tune: bool = True,
+) -> list:
+    if any(img is None for img in images):
+        raise ValueError("Empty image (None).")
+    if not images:
+        return []
+
+    if pipeline is None:
+        pipeline = DEFAULT_PIPELINE
+    validate_pipeline(pipeline)
+
+    with _thread_limits.exclusive():
+        if workers is not None or threads is not None:
+            if workers is None:
+                workers = max(1, _CPU_COUNT // max(threads, 1))
+            if threads is None:
+                threads = max(1, _CPU_COUNT // max(workers, 1))
+            return _run_split(images, workers, threads, lang, pipeline)[0]
+
+        bucket = _size_bucket(images, pipeline)
+        if not auto_tune:
+            with _sched_lock:
+                state = _tuning.get(bucket)
+                split = state["best"] if state and state["best"] else _fallback_split(state)
+            return _run_split(images, split[0], split[1], lang, pipeline)[0]
+
+        # Tuning spans calls: each batch (or chunk of a large batch) measures
+        # the next candidate that still needs waves, until all are measured.
+        results = []
+        remaining = list(images)
+        while remaining:
+            with _sched_lock:
+                state = _tuning.setdefault(bucket, {"timings": {}, "best": None})
+                split, needed = _next_tuning_step(state)
+
+            record = needed is not None
+            if record:
+                # Only whole waves are measured, so every worker is busy. Candidates
+                # are in increasing worker order, so if this one doesn't fit, none does.
+                size = min(needed, len(remaining) // split[0] * split[0])
+                if size == 0:
+                    with _sched_lock:
+                        split = _fallback_split(state)
+                    size, record = len(remaining), False
+            else:
+                size = len(remaining)
+
+            part = remaining[:size]
+            remaining = remaining[size:]
+            out, pixels, elapsed = _run_split(part, split[0], split[1], lang, pipeline)
+            results.extend(out)
+
+            if record:
+                with _sched_lock:
+                    timing = state["timings"].setdefault(split, [0, 0, 0.0])
+                    timing[0] += len(part)
+                    timing[1] += pixels
+                    timing[2] += elapsed
+                    # Commits the best split as soon as every candidate is measured
+                    _next_tuning_step(state)
+
+        return results
+
+
+def get_metrics() -> dict:
+    with _sched_lock:
+        seconds = _metrics["seconds"]
+        omp = os.environ.get("OMP_THREAD_LIMIT")
+        return {
+            "cpu_count": _CPU_COUNT,
+            # Current process-wide settings, as seen by single ocr_bgr calls
+            "omp_thread_limit": int(omp) if omp and omp.isdigit() else None,
+            "cv_threads": cv2.getNumThreads(),
+            # Split used by the most recent batch (None before any batch)
+            "last_split": (
+                {"workers": _last_split[0], "threads": _last_split[1]} if _last_split else None
+            ),
+            "images": _metrics["images"],
+            "seconds": seconds,
+            "images_per_sec": _metrics["images"] / seconds if seconds > 0 else 0.0,
+            "pixels_per_sec": _metrics["pixels"] / seconds if seconds > 0 else 0.0,
+            "tuning": {
+                bucket: {
+                    "best": (
+                        {"workers": state["best"][0], "threads": state["best"][1]}
+                        if state["best"] else None
+                    ),
+                    "candidates": [
+                        {
+                            "workers": w,
+                            "threads": t,
+                            "images": n,
+                            "pixels_per_sec": px / s if s > 0 else 0.0,
+                        }
+                        for (w, t), (n, px, s) in state["timings"].items()
+                    ],
+                }
+                for bucket, state in _tuning.items()
+            },
+        }
@@ -0,0 +1,32 @@
+import os
+import stat
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ocr_engine looks for Tesseract at import time. Put a stub on PATH that just
+# writes an empty result file, so the tests don't need a real install.
+_STUB_DIR = tempfile.mkdtemp(prefix="tesseract-stub-")
+if sys.platform == "win32":
+    _STUB = os.path.join(_STUB_DIR, "tesseract.bat")
+    _SCRIPT = '@echo off\ntype nul > "%~2.txt"\n'
+else:
+    _STUB = os.path.join(_STUB_DIR, "tesseract")
+    _SCRIPT = '#!/bin/sh\nprintf "" > "$2.txt"\n'
+with open(_STUB, "w") as f:
+    f.write(_SCRIPT)
+os.chmod(_STUB, os.stat(_STUB).st_mode | stat.S_IEXEC)
+os.environ["PATH"] = _STUB_DIR + os.pathsep + os.environ.get("PATH", "")
+
+import ocr_engine  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    ocr_engine.clear_preprocess_cache()
+    yield
+    ocr_engine.clear_preprocess_cache()
@@ -0,0 +1,144 @@
+import functools
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import ocr_engine
+
+
+def _baseline_preprocess(img_bgr):
+    # The hard-coded preprocessing that DEFAULT_PIPELINE replaced
+    h, w = img_bgr.shape[:2]
+    if max(h, w) < 1800:
+        scale = 1800 / max(h, w)
+        img_bgr = cv2.resize(img_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    gray = cv2.medianBlur(gray, 3)
+    blurred = cv2.GaussianBlur(gray, (0, 0), 1.0)
+    sharp = cv2.addWeighted(gray, 1.6, blurred, -0.6, 0)
+    return cv2.threshold(sharp, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def _image(h, w, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def stage_calls(monkeypatch):
+    calls = []
+    for name, fn in list(ocr_engine.STAGES.items()):
+        def wrap(name=name, fn=fn):
+            @functools.wraps(fn)
+            def stage(*args, **kwargs):
+                calls.append(name)
+                return fn(*args, **kwargs)
+            return stage
+        monkeypatch.setitem(ocr_engine.STAGES, name, wrap())
+    return calls
+
+
+@pytest.mark.parametrize("shape", [(600, 900), (2000, 1500)])
+@pytest.mark.parametrize("cache", [False, True])
+def test_default_pipeline_matches_baseline(shape, cache):
+    img = _image(*shape)
+    expected = _baseline_preprocess(img.copy())
+    out = ocr_engine._preprocess_for_ocr(img, cache=cache)
+    assert out.dtype == expected.dtype
+    assert out.shape == expected.shape
+    assert out.tobytes() == expected.tobytes()
+
+
+def test_changing_last_stages_reruns_only_those(stage_calls):
+    img = _image(600, 900)
+    ocr_engine._preprocess_for_ocr(img, cache=True)
+    assert stage_calls == [s["stage"] for s in ocr_engine.DEFAULT_PIPELINE]
+
+    tweaked = [dict(s) for s in ocr_engine.DEFAULT_PIPELINE]
+    tweaked[-2]["sigma"] = 2.0
+    stage_calls.clear()
+    ocr_engine._preprocess_for_ocr(img, pipeline=tweaked, cache=True)
+    assert stage_calls == ["unsharp", "otsu"]
+
+    stage_calls.clear()
+    ocr_engine._preprocess_for_ocr(img, pipeline=tweaked, cache=True)
+    assert stage_calls == []
+
+
+def test_cache_is_opt_in(stage_calls):
+    img = _image(600, 900)
+    ocr_engine._preprocess_for_ocr(img)
+    ocr_engine._preprocess_for_ocr(img)
+    assert len(stage_calls) == 2 * len(ocr_engine.DEFAULT_PIPELINE)
+    assert not ocr_engine._cache
+
+
+def test_cache_never_aliases_input():
+    img = _image(2000, 1500)  # upscale is a no-op, so it returns its input
+    expected = ocr_engine._preprocess_for_ocr(img.copy())
+    ocr_engine._preprocess_for_ocr(img, cache=True)
+
+    for cached in ocr_engine._cache.values():
+        assert not np.shares_memory(cached, img)
+        assert not cached.flags.writeable
+
+    snapshot = img.copy()
+    img[:] = 0
+    out = ocr_engine._preprocess_for_ocr(snapshot, cache=True)
+    assert out.tobytes() == expected.tobytes()
+
+
+def test_cache_bytes_count_unique_arrays():
+    # Grayscale input: upscale and grayscale both pass the array through
+    gray = _image(2000, 1500)[:, :, 0].copy()
+    ocr_engine._preprocess_for_ocr(gray, cache=True)
+
+    unique = {id(v): v.nbytes for v in ocr_engine._cache.values()}
+    assert len(unique) == len(ocr_engine._cache)
+    assert ocr_engine._cache_bytes == sum(unique.values())
+
+
+def test_cache_bounded_by_bytes(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "_CACHE_MAX_BYTES", 10_000_000)
+    ocr_engine._preprocess_for_ocr(_image(2000, 1500), cache=True)
+    assert ocr_engine._cache_bytes == sum(v.nbytes for v in ocr_engine._cache.values())
+    assert ocr_engine._cache_bytes <= ocr_engine._CACHE_MAX_BYTES
+
+
+def test_tile_grid_size_accepts_pair():
+    img = _image(600, 900)
+    square = ocr_engine._preprocess_for_ocr(img)
+    pipeline = [dict(s) for s in ocr_engine.DEFAULT_PIPELINE]
+    pipeline[2]["tile_grid_size"] = [8, 8]
+    assert ocr_engine._preprocess_for_ocr(img, pipeline=pipeline).tobytes() == square.tobytes()
+
+
+@pytest.mark.parametrize(
+    "profile, match",
+    [
+        ({"stage": "otsu"}, "must be a list"),
+        (["otsu"], "expected an object"),
+        ([{"stage": "blur"}], "Unknown preprocessing stage"),
+        ([{"stage": ["x"]}], "Unknown preprocessing stage"),
+        ([{"stage": "clahe", "clip": 3}], "'clip' for stage 'clahe'"),
+        ([{"stage": "median", "ksize": 4}], "'ksize' in stage 'median'"),
+        ([{"stage": "median", "ksize": True}], "'ksize' in stage 'median'"),
+        ([{"stage": "clahe", "tile_grid_size": [8]}], "'tile_grid_size' in stage 'clahe'"),
+        ([{"stage": "clahe", "clip_limit": "2"}], "'clip_limit' in stage 'clahe'"),
+        ([{"stage": "unsharp", "sigma": 0}], "'sigma' in stage 'unsharp'"),
+        ([{"stage": "upscale", "target_long_side": -1}], "'target_long_side' in stage 'upscale'"),
+    ],
+)
+def test_load_pipeline_rejects_invalid_profiles(tmp_path, profile, match):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(profile))
+    with pytest.raises(ValueError, match=match):
+        ocr_engine.load_pipeline(str(path))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "profile.json")
+    ocr_engine.save_pipeline(ocr_engine.DEFAULT_PIPELINE, path)
+    assert ocr_engine.load_pipeline(path) == ocr_engine.DEFAULT_PIPELINE
@@ -0,0 +1,138 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import ocr_engine
+
+FAST = [{"stage": "grayscale"}]
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "_CPU_COUNT", 4)
+    monkeypatch.setattr(ocr_engine, "_tuning", {})
+    monkeypatch.setattr(ocr_engine, "_metrics", {"images": 0, "pixels": 0, "seconds": 0.0})
+    monkeypatch.setattr(ocr_engine, "_last_split", None)
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+
+
+@pytest.fixture
+def tesseract_env(monkeypatch):
+    # Records (OMP_THREAD_LIMIT, cv2 threads) seen by each Tesseract call
+    seen = []
+
+    def image_to_string(img, lang=None, config=None):
+        seen.append((os.environ.get("OMP_THREAD_LIMIT"), cv2.getNumThreads()))
+        return ""
+
+    monkeypatch.setattr(ocr_engine.pytesseract, "image_to_string", image_to_string)
+    return seen
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    # Records (images, workers, threads) for each chunk a batch runs
+    calls = []
+    run_split = ocr_engine._run_split
+
+    def spy(images, workers, threads, lang, pipeline):
+        calls.append((len(images), workers, threads))
+        return run_split(images, workers, threads, lang, pipeline)
+
+    monkeypatch.setattr(ocr_engine, "_run_split", spy)
+    return calls
+
+
+def _images(n, h=100, w=100):
+    return [np.full((h, w, 3), 255, np.uint8) for _ in range(n)]
+
+
+@pytest.mark.parametrize("prev", [None, "3"])
+def test_batch_split_applied_then_restored(tesseract_env, prev, monkeypatch):
+    if prev is not None:
+        monkeypatch.setenv("OMP_THREAD_LIMIT", prev)
+    cv_before = cv2.getNumThreads()
+
+    ocr_engine.ocr_batch(_images(4), pipeline=FAST, workers=2, threads=1)
+
+    assert set(tesseract_env) == {("1", 1)}
+    assert os.environ.get("OMP_THREAD_LIMIT") == prev
+    assert cv2.getNumThreads() == cv_before
+
+
+@pytest.mark.parametrize("split", [{"workers": 0}, {"threads": 0}, {"workers": 0, "threads": 2}])
+def test_invalid_split_raises(tesseract_env, split):
+    with pytest.raises(ValueError):
+        ocr_engine.ocr_batch(_images(2), pipeline=FAST, **split)
+
+
+def test_metrics_before_any_batch():
+    metrics = ocr_engine.get_metrics()
+    assert metrics["omp_thread_limit"] is None
+    assert metrics["last_split"] is None
+
+
+def test_tuning_measures_whole_waves_only(tesseract_env, chunks):
+    for _ in range(10):
+        ocr_engine.ocr_batch(_images(3), pipeline=FAST)
+
+    state = ocr_engine._tuning[ocr_engine._size_bucket(_images(1), FAST)]
+    for (workers, _), (n, _, _) in state["timings"].items():
+        assert n % workers == 0
+    # 3-image batches can never fill 4 workers, so (4, 1) is never measured
+    assert (4, 1) not in state["timings"]
+    assert state["best"] is None
+    assert all(n >= w or (w, t) == ocr_engine._fallback_split(state) for n, w, t in chunks)
+
+
+def test_tuning_across_chunks_of_a_large_batch(tesseract_env, chunks):
+    ocr_engine.ocr_batch(_images(25), pipeline=FAST)
+
+    waves = ocr_engine._TUNE_WAVES
+    assert chunks[:3] == [(waves * 1, 1, 4), (waves * 2, 2, 2), (waves * 4, 4, 1)]
+    state = ocr_engine._tuning[ocr_engine._size_bucket(_images(1), FAST)]
+    assert state["best"] in ocr_engine._candidate_splits()
+    assert chunks[3][1:] == state["best"]
+    assert sum(n for n, _, _ in chunks) == 25
+
+
+def test_size_bucket_uses_upscaled_size():
+    pipeline = ocr_engine.DEFAULT_PIPELINE
+    small = _images(1, 400, 600)
+    large = _images(1, 1200, 1800)
+    assert ocr_engine._work_pixels(small[0], pipeline) == ocr_engine._work_pixels(large[0], pipeline)
+    assert ocr_engine._size_bucket(small, pipeline) == ocr_engine._size_bucket(large, pipeline)
+
+
+def test_single_call_waits_for_running_batch(monkeypatch):
+    in_batch = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def image_to_string(img, lang=None, config=None):
+        seen.append(os.environ.get("OMP_THREAD_LIMIT"))
+        if not in_batch.is_set():
+            in_batch.set()
+            release.wait(5)
+        return ""
+
+    monkeypatch.setattr(ocr_engine.pytesseract, "image_to_string", image_to_string)
+
+    batch = threading.Thread(
+        target=ocr_engine.ocr_batch, args=(_images(1),), kwargs={"pipeline": FAST, "workers": 1, "threads": 1}
+    )
+    batch.start()
+    assert in_batch.wait(5)
+
+    single = threading.Thread(target=ocr_engine.ocr_bgr, args=(_images(1)[0],), kwargs={"pipeline": FAST})
+    single.start()
+    single.join(0.2)
+    assert single.is_alive()
+
+    release.set()
+    batch.join(5)
+    single.join(5)
+    assert seen == ["1", None]